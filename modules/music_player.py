@@ -1,29 +1,46 @@
-import re
+import os
 
 import vlc
 import tkinter as tk
-from PIL import Image, ImageTk
+from PIL import ImageTk
 from tkinter import ttk, filedialog, scrolledtext
 
-from scripts.lyrics_handler import LyricsHandler
-from scripts.media_handler import MediaInfoHandler
+from scripts.track_prefetcher import TrackPrefetcher
 
 class MusicPlayer(ttk.Frame):
-    def __init__(self, parent):
+    def __init__(self, parent, prefetch_count=3):
         super().__init__(parent)
         self.parent = parent
 
         self.vlc_instance = vlc.Instance()
         self.player = self.vlc_instance.media_player_new()
+
+        # The media list player moves on to the next track by itself, so transitions never wait on the UI
+        self.media_list = self.vlc_instance.media_list_new()
+        self.list_player = self.vlc_instance.media_list_player_new()
+        self.list_player.set_media_player(self.player)
+        self.list_player.set_media_list(self.media_list)
+
+        # Metadata, thumbnails and lyrics of the upcoming tracks are loaded off the Tk thread
+        self.prefetcher = TrackPrefetcher()
+        self.prefetch_count = prefetch_count
+
+        self.playlist = []
+        self.current_index = -1
         self.is_slider_active = False
         self.current_song = ""
         self.is_playing = False
+        self.synced_lyrics = []
+        self.song_info_poll = None  # Pending after() id while waiting for the current track to load
 
         self.create_widgets()
         self.update_progress()
 
+        # Coming back from the Lyrics Synchronizer view picks up lyrics it wrote for the current track
+        self.bind("<Map>", lambda event: self.refresh_current_track())
+
     def create_widgets(self):
-        self.load_button = ttk.Button(self, text="Load Song", command=self.load_song)
+        self.load_button = ttk.Button(self, text="Add Songs", command=self.add_songs)
         self.load_button.pack()
 
         self.album_cover_label = ttk.Label(self)
@@ -34,8 +51,12 @@ class MusicPlayer(ttk.Frame):
 
         self.play_icon = tk.PhotoImage(file='./assets/play_icon.png')
         self.pause_icon = tk.PhotoImage(file='./assets/pause_icon.png')
+        self.previous_button = ttk.Button(control_frame, text="Previous", command=self.previous_song)
+        self.previous_button.pack(side=tk.LEFT)
         self.play_pause_button = ttk.Button(control_frame, image=self.play_icon, command=self.toggle_play_pause)
         self.play_pause_button.pack(side=tk.LEFT)
+        self.next_button = ttk.Button(control_frame, text="Next", command=self.next_song)
+        self.next_button.pack(side=tk.LEFT)
 
         self.time_slider = ttk.Scale(self, from_=0, to=100, orient='horizontal', command=self.on_slider_move, length=300)
         self.time_slider.pack(pady=10, padx=10)
@@ -46,6 +67,10 @@ class MusicPlayer(ttk.Frame):
         self.time_info = ttk.Label(self, text="00:00 / 00:00")
         self.time_info.pack()
 
+        self.playlist_box = tk.Listbox(self, width=40, height=5)
+        self.playlist_box.pack(pady=10)
+        self.playlist_box.bind("<Double-Button-1>", self.on_playlist_double_click)
+
         self.lyrics_display = scrolledtext.ScrolledText(self, wrap=tk.WORD, width=40, height=10)
         self.lyrics_display.pack(pady=10)
 
@@ -54,61 +79,91 @@ class MusicPlayer(ttk.Frame):
         self.sync_lyrics_display.pack(pady=10)
 
     # Media Handling
-    def load_song(self):
-        song_path = filedialog.askopenfilename(filetypes=[("Audio Files", "*.mp3 *.flac")])
-        if song_path:
-            self.current_song = song_path
-            media = self.vlc_instance.media_new(song_path)
-            media.parse()
-            self.player.set_media(media)
-            self.time_slider.configure(to=media.get_duration() / 1000)
-            self.update_song_info()
+    def add_songs(self):
+        song_paths = filedialog.askopenfilenames(filetypes=[("Audio Files", "*.mp3 *.flac")])
+        if not song_paths:
+            return
+
+        # Media objects are created unparsed, VLC reads the files when it reaches them
+        self.media_list.lock()
+        for song_path in song_paths:
+            self.media_list.add_media(self.vlc_instance.media_new(song_path))
+        self.media_list.unlock()
+
+        for song_path in song_paths:
+            self.playlist.append(song_path)
+            self.playlist_box.insert(tk.END, os.path.basename(song_path))
+
+        if self.current_index < 0:
+            self.show_track(0)
+        self.prefetch_upcoming()
+
+    def prefetch_upcoming(self, revalidate=()):
+        # The window also keeps the previous track, so going back doesn't have to reload it
+        start = max(self.current_index, 0)
+        self.prefetcher.prefetch(self.playlist[max(start - 1, 0):start + self.prefetch_count + 1], revalidate)
+
+    def show_track(self, index):
+        self.current_index = index
+        self.current_song = self.playlist[index]
+        self.playlist_box.selection_clear(0, tk.END)
+        self.playlist_box.selection_set(index)
+        self.playlist_box.see(index)
+        self.refresh_current_track()
+
+    def refresh_current_track(self):
+        # Checks once per track change whether the track changed on disk, the check itself runs on the prefetch thread
+        if not self.current_song:
+            return
+        self.prefetch_upcoming(revalidate=[self.current_song])
+        self.update_song_info()
+
+    def sync_current_track(self):
+        # Picks up the transitions the media list player makes on its own
+        media = self.player.get_media()
+        if media is None:
+            return
+
+        self.media_list.lock()
+        index = self.media_list.index_of_item(media)
+        self.media_list.unlock()
+
+        if index >= 0 and index != self.current_index:
+            self.show_track(index)
 
     # UI Update Methods
     def update_song_info(self):
-        if self.current_song:
-            song_name, artist_name, album_art_image = MediaInfoHandler.get_track_info(self.current_song)
-            self.song_info.config(text=f"Song: {song_name}")
-            self.update_album_art_ui(album_art_image)
-            self.update_lyrics_display()
+        # Only one poll is ever pending, whichever call comes last replaces it
+        if self.song_info_poll is not None:
+            self.after_cancel(self.song_info_poll)
+            self.song_info_poll = None
+        if not self.current_song:
+            return
+
+        track = self.prefetcher.get(self.current_song)
+        if track is None:
+            # Not loaded yet, check back shortly instead of blocking on the file
+            self.song_info.config(text="Song: Loading...")
+            self.song_info_poll = self.after(100, self.update_song_info)
+            return
+
+        self.song_info.config(text=f"Song: {track['song_name']}")
+        self.time_slider.configure(to=track["duration"])
+        self.update_album_art_ui(track["album_art"])
+        self.update_lyrics_display(track)
 
     def update_album_art_ui(self, album_art_image):
+        self.album_cover_label.config(image='')
         self.album_cover_label.image = None
         if album_art_image:
-            album_art_image = album_art_image.resize((200, 200), Image.Resampling.LANCZOS)
             photo = ImageTk.PhotoImage(album_art_image)
             self.album_cover_label.config(image=photo)
             self.album_cover_label.image = photo
 
-    def update_lyrics_display(self):
-        lyrics = LyricsHandler.retrieve_lyrics_from_file(self.current_song)
+    def update_lyrics_display(self, track):
         self.lyrics_display.delete(1.0, tk.END)
-        self.lyrics_display.insert(tk.END, lyrics["unsynced_lyrics"] if lyrics["unsynced_lyrics"] else "Lyrics not available.")
-        self.synced_lyrics = self.parse_synced_lyrics(lyrics["synced_lyrics"])
-
-    def parse_synced_lyrics(self, synced_lyrics_raw):
-        parsed_synced_lyrics = []
-        lines = synced_lyrics_raw.split('\n')
-        for line in lines:
-            # Find all timestamps and text in the line
-            parts = re.findall(r'\[\d\d:\d\d\.\d\d\]|\S+', line)
-
-            # Check if line has at least two timestamps and text
-            if len(parts) >= 3 and re.match(r'\[\d\d:\d\d\.\d\d\]', parts[0]) and re.match(r'\[\d\d:\d\d\.\d\d\]', parts[1]):
-                start_time_str = parts[0].strip('[]')
-                end_time_str = parts[1].strip('[]')
-
-                start_minutes, start_seconds = map(float, start_time_str.split(':'))
-                start_time_ms = int((start_minutes * 60 + start_seconds) * 1000)
-
-                end_minutes, end_seconds = map(float, end_time_str.split(':'))
-                end_time_ms = int((end_minutes * 60 + end_seconds) * 1000)
-
-                text = ' '.join(parts[2:])  # Join remaining parts as text
-
-                parsed_synced_lyrics.append((start_time_ms, end_time_ms, text))
-
-        return parsed_synced_lyrics
+        self.lyrics_display.insert(tk.END, track["unsynced_lyrics"] if track["unsynced_lyrics"] else "Lyrics not available.")
+        self.synced_lyrics = track["synced_lyrics"]
 
     def update_synced_lyrics_display(self, current_time):
         if not hasattr(self, 'synced_lyrics') or not self.synced_lyrics:
@@ -128,6 +183,12 @@ class MusicPlayer(ttk.Frame):
             return
 
         try:
+            self.sync_current_track()
+            # The player briefly reports Ended between tracks too, only the last one ends playback
+            if self.list_player.get_state() == vlc.State.Ended and self.current_index == len(self.playlist) - 1:
+                self.set_playing(False)
+                return
+
             current_time = self.player.get_time()
 
             total_time = self.time_slider.cget("to") * 1000
@@ -144,11 +205,34 @@ class MusicPlayer(ttk.Frame):
     def toggle_play_pause(self):
         if self.current_song:
             if self.is_playing:
-                self.player.pause()
+                self.list_player.pause()
+            elif self.player.get_media() is None or self.list_player.get_state() == vlc.State.Ended:
+                self.list_player.play_item_at_index(self.current_index)
             else:
-                self.player.play()
-            self.is_playing = not self.is_playing
-            self.play_pause_button.config(image=self.pause_icon if self.is_playing else self.play_icon)
+                self.list_player.play()
+            self.set_playing(not self.is_playing)
+
+    # next() and previous() return -1 at either end of the playlist, where nothing starts playing
+    def next_song(self):
+        if self.current_song and self.list_player.next() == 0:
+            self.set_playing(True)
+
+    def previous_song(self):
+        if self.current_song and self.list_player.previous() == 0:
+            self.set_playing(True)
+
+    def on_playlist_double_click(self, event):
+        selection = self.playlist_box.curselection()
+        if selection:
+            self.list_player.play_item_at_index(selection[0])
+            self.set_playing(True)
+
+    def set_playing(self, is_playing):
+        was_playing = self.is_playing
+        self.is_playing = is_playing
+        self.play_pause_button.config(image=self.pause_icon if self.is_playing else self.play_icon)
+        # Avoid starting a second progress loop when one is already running
+        if is_playing and not was_playing:
             self.update_progress()
 
     def on_slider_move(self, value):
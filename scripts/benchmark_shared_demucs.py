@@ -0,0 +1,71 @@
+import os
+import time
+import shutil
+import argparse
+import tempfile
+
+from scripts.transcription_handler import TranscriptionHandler
+
+def copy_tracks(file_paths, target_dir):
+    # Work on copies so the benchmark never rewrites the tags of the originals
+    copies = []
+    for file_path in file_paths:
+        copy_path = os.path.join(target_dir, os.path.basename(file_path))
+        shutil.copy2(file_path, copy_path)
+        copies.append(copy_path)
+    return copies
+
+def run_per_track(handler, file_paths, lyrics):
+    for file_path in file_paths:
+        handler(file_path, lyrics=lyrics)
+
+def run_shared_demucs(handler, file_paths, lyrics):
+    handler.transcribe_tracks(file_paths, lyrics=lyrics)
+
+def timed_run(run, handler, file_paths, lyrics):
+    with tempfile.TemporaryDirectory() as work_dir:
+        copies = copy_tracks(file_paths, work_dir)
+        copy_lyrics = {copy: lyrics[file_path] for copy, file_path in zip(copies, file_paths)}
+        start = time.perf_counter()
+        run(handler, copies, copy_lyrics)
+        return time.perf_counter() - start
+
+def benchmark(file_paths, model_name='base', repeats=2):
+    handler = TranscriptionHandler(model_name=model_name, device='cpu')
+
+    # Lyric lookups are network bound and identical for both paths, keep them out of the timings.
+    # What remains is the cost of reloading Demucs for every track, not a batched-inference speedup.
+    print("Fetching lyrics outside the timed runs...")
+    lyrics = handler.fetch_lyrics(file_paths)
+
+    # Untimed pass so neither path pays for cold model files or the first torch kernel runs
+    print("Warming up...")
+    timed_run(run_per_track, handler, file_paths[:1], lyrics)
+
+    runs = {"per-track": run_per_track, "shared-demucs": run_shared_demucs}
+    results = {label: [] for label in runs}
+    for repeat in range(repeats):
+        # Alternate the order so any drift over the session affects both paths equally
+        order = list(runs) if repeat % 2 == 0 else list(reversed(list(runs)))
+        for label in order:
+            results[label].append(timed_run(runs[label], handler, file_paths, lyrics))
+
+    print("\n-----------------------\n")
+    print(f"Tracks: {len(file_paths)}, model: {model_name}, device: cpu, repeats: {repeats}")
+    means = {}
+    for label, timings in results.items():
+        means[label] = sum(timings) / len(timings)
+        tracks_per_hour = len(file_paths) / means[label] * 3600
+        runs_text = ', '.join(f"{elapsed:.1f}s" for elapsed in timings)
+        print(f"{label:>13}: {means[label]:8.1f}s mean ({runs_text}), {tracks_per_hour:8.1f} tracks/hour")
+    print(f"      speedup: {means['per-track'] / means['shared-demucs']:.2f}x")
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure what sharing one Demucs model across tracks saves on CPU.")
+    parser.add_argument("files", nargs="+", help="MP3/FLAC files to process.")
+    parser.add_argument("--model", default="base", help="Whisper model name.")
+    parser.add_argument("--repeats", type=int, default=2, help="Timed runs per path, alternating which path goes first.")
+    args = parser.parse_args()
+
+    benchmark(args.files, model_name=args.model, repeats=args.repeats)
@@ -1,12 +1,28 @@
 import os
 import re
+import logging
+import threading
 
 import syncedlyrics
 from mutagen.mp3 import MP3
 from mutagen.id3 import ID3
 from mutagen.flac import FLAC
 
+class _ProviderErrorCollector(logging.Handler):
+    # syncedlyrics logs provider failures instead of raising them, this keeps the ones raised on the calling thread
+    def __init__(self):
+        super().__init__(logging.ERROR)
+        self.thread_id = threading.get_ident()
+        self.messages = []
+
+    def emit(self, record):
+        if record.thread == self.thread_id:
+            self.messages.append(record.getMessage())
+
+
 class LyricsHandler:
+    LYRICS_NOT_FOUND = "Lyrics not found."
+
     # For retrieving lyrics embedded in a music file
     @staticmethod
     def retrieve_lyrics_from_file(file_path):
@@ -77,17 +93,24 @@ class LyricsHandler:
                 return str(audio[key])
         return None
 
-    # Fetch lyrics from an online database
+    # Fetch lyrics from an online database. The error is LYRICS_NOT_FOUND only when every provider
+    # answered without lyrics, an unreachable provider is reported as a failed lookup instead.
     @staticmethod
     def search_lyrics_online(track_name, artist_name):
+        provider_errors = _ProviderErrorCollector()
+        logging.getLogger().addHandler(provider_errors)
         try:
             online_lyrics = syncedlyrics.search(f"{track_name} {artist_name}")
             if online_lyrics:
                 return LyricsHandler._process_online_lyrics(online_lyrics)
+            elif provider_errors.messages:
+                return {"error": f"Lyrics lookup failed: {'; '.join(provider_errors.messages)}"}
             else:
-                return {"error": "Lyrics not found."}
+                return {"error": LyricsHandler.LYRICS_NOT_FOUND}
         except Exception as e:
             return {"error": f"An error occurred: {e}"}
+        finally:
+            logging.getLogger().removeHandler(provider_errors)
 
     @staticmethod
     def _process_online_lyrics(online_lyrics):
@@ -97,3 +120,32 @@ class LyricsHandler:
             "original_lyrics": online_lyrics, 
             "processed_lyrics": '\n'.join(processed_lyrics)
         }
+
+    # Parse enhanced LRC lines ("[start] [end] text") into (start_ms, end_ms, text) tuples
+    @staticmethod
+    def parse_synced_lyrics(synced_lyrics_raw):
+        parsed_synced_lyrics = []
+        if not synced_lyrics_raw:
+            return parsed_synced_lyrics
+
+        lines = synced_lyrics_raw.split('\n')
+        for line in lines:
+            # Find all timestamps and text in the line
+            parts = re.findall(r'\[\d\d:\d\d\.\d\d\]|\S+', line)
+
+            # Check if line has at least two timestamps and text
+            if len(parts) >= 3 and re.match(r'\[\d\d:\d\d\.\d\d\]', parts[0]) and re.match(r'\[\d\d:\d\d\.\d\d\]', parts[1]):
+                start_time_str = parts[0].strip('[]')
+                end_time_str = parts[1].strip('[]')
+
+                start_minutes, start_seconds = map(float, start_time_str.split(':'))
+                start_time_ms = int((start_minutes * 60 + start_seconds) * 1000)
+
+                end_minutes, end_seconds = map(float, end_time_str.split(':'))
+                end_time_ms = int((end_minutes * 60 + end_seconds) * 1000)
+
+                text = ' '.join(parts[2:])  # Join remaining parts as text
+
+                parsed_synced_lyrics.append((start_time_ms, end_time_ms, text))
+
+        return parsed_synced_lyrics
@@ -32,6 +32,15 @@ class MediaInfoHandler:
         album_art_image = MediaInfoHandler.get_album_art_flac(audio)
         return song_name, artist_name, album_art_image
 
+    @staticmethod
+    def get_duration(file_path):
+        # Read from the stream headers, which is much cheaper than having VLC parse the file
+        if file_path.lower().endswith('.mp3'):
+            return MP3(file_path).info.length
+        elif file_path.lower().endswith('.flac'):
+            return FLAC(file_path).info.length
+        return 0
+
     @staticmethod
     def get_album_art_mp3(audio):
         if 'APIC:' in audio:
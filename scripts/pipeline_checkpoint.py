@@ -0,0 +1,128 @@
+import os
+import re
+import json
+import shutil
+import hashlib
+import tempfile
+
+class PipelineCheckpoint:
+    """
+    Tracks which pipeline stages have completed for a single track.
+
+    Intermediate artifacts and a state.json manifest live in a work directory
+    derived from the track's absolute path, so a crashed run can be restarted
+    from the first incomplete stage. If the source file changed since the
+    checkpoint was written, the stale work directory is discarded, unless it
+    matches the tagged copy the embed stage was about to swap in.
+    """
+
+    def __init__(self, file_path, work_root='./work'):
+        self.file_path = file_path
+        track_id = hashlib.sha1(os.path.abspath(file_path).encode('utf-8')).hexdigest()
+        self.work_dir = os.path.join(work_root, track_id)
+        self.state_path = os.path.join(self.work_dir, 'state.json')
+
+        os.makedirs(self.work_dir, exist_ok=True)
+        self.state = self._load_state()
+
+    def _source_signature(self, file_path=None):
+        stat = os.stat(file_path or self.file_path)
+        return [stat.st_size, stat.st_mtime_ns]
+
+    def _load_state(self):
+        if os.path.exists(self.state_path):
+            with open(self.state_path, 'r', encoding='utf-8') as state_file:
+                state = json.load(state_file)
+            signature = self._source_signature()
+            if signature in (state.get("source_signature"), state.get("replacement_signature")):
+                state["source_signature"] = signature
+                return state
+            print(f"{self.file_path} changed since the last run, discarding its checkpoints...")
+            shutil.rmtree(self.work_dir)
+            os.makedirs(self.work_dir)
+
+        return {
+            "source": os.path.abspath(self.file_path),
+            "source_signature": self._source_signature(),
+            "timings": {},
+        }
+
+    def path(self, artifact_name):
+        return os.path.join(self.work_dir, artifact_name)
+
+    def is_done(self, stage):
+        return stage in self.state["timings"]
+
+    def complete(self, stage, elapsed, source_modified=False):
+        # A stage that rewrites the source file must refresh the signature, otherwise the next run would discard the checkpoint
+        if source_modified:
+            self.state["source_signature"] = self._source_signature()
+        self.state["timings"][stage] = elapsed
+        PipelineCheckpoint.atomic_write(self.state_path, json.dumps(self.state, indent=2))
+
+    def expect_source_change(self, replacement_path):
+        # Called before replacement_path is moved over the source. os.replace keeps its size and mtime,
+        # so a crash right after the swap still finds a known signature on the next run.
+        self.state["replacement_signature"] = self._source_signature(replacement_path)
+        PipelineCheckpoint.atomic_write(self.state_path, json.dumps(self.state, indent=2))
+
+    def write_json(self, artifact_name, data):
+        PipelineCheckpoint.atomic_write(self.path(artifact_name), json.dumps(data))
+
+    def read_json(self, artifact_name):
+        with open(self.path(artifact_name), 'r', encoding='utf-8') as artifact_file:
+            return json.load(artifact_file)
+
+    def sweep_temp_files(self, target_paths):
+        """
+        Remove the temporary copies of target_paths and of this track's artifacts that a
+        killed run never moved into place, as named by atomic_path.
+        """
+        # Same shape as the names tempfile.mkstemp gives atomic_path: prefix, 8 random characters, suffix
+        stale_names = [(self.work_dir, re.compile(r'\..+\.[a-z0-9_]{8}\.tmp.*'))]
+        for target_path in target_paths:
+            directory, file_name = os.path.split(os.path.abspath(target_path))
+            extension = os.path.splitext(file_name)[1]
+            stale_names.append((directory, re.compile(rf'\.{re.escape(file_name)}\.[a-z0-9_]{{8}}\.tmp{re.escape(extension)}')))
+
+        for directory, stale_name in stale_names:
+            for file_name in os.listdir(directory):
+                if stale_name.fullmatch(file_name):
+                    print(f"Removing leftover temporary file {file_name}...")
+                    os.remove(os.path.join(directory, file_name))
+
+    def finish(self):
+        print("Stage timings:")
+        for stage, elapsed in self.state["timings"].items():
+            print(f"  {stage}: {elapsed:.1f}s")
+        shutil.rmtree(self.work_dir, ignore_errors=True)
+
+    @staticmethod
+    def atomic_path(target_path):
+        """
+        Return a temporary path next to target_path, keeping its extension so tools that
+        infer the format from the file name still work. Move it into place with os.replace.
+        """
+        directory, file_name = os.path.split(os.path.abspath(target_path))
+        extension = os.path.splitext(file_name)[1]
+        fd, temp_path = tempfile.mkstemp(prefix=f'.{file_name}.', suffix=f'.tmp{extension}', dir=directory)
+        os.close(fd)
+
+        # mkstemp creates files as 0600, keep the permissions the target would normally have
+        mode = os.stat(target_path).st_mode & 0o777 if os.path.exists(target_path) else 0o644
+        os.chmod(temp_path, mode)
+        return temp_path
+
+    @staticmethod
+    def atomic_write(target_path, content):
+        temp_path = PipelineCheckpoint.atomic_path(target_path)
+        try:
+            with open(temp_path, 'w', encoding='utf-8') as temp_file:
+                temp_file.write(content)
+                temp_file.flush()
+                os.fsync(temp_file.fileno())
+            os.replace(temp_path, target_path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
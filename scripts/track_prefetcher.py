@@ -0,0 +1,117 @@
+import os
+from queue import Queue
+from threading import Thread, Lock
+
+from PIL import Image
+
+from scripts.lyrics_handler import LyricsHandler
+from scripts.media_handler import MediaInfoHandler
+
+class TrackPrefetcher:
+    """
+    Loads track metadata, album art thumbnails and lyric timelines on a background thread.
+
+    Everything returned is plain data (strings, tuples, PIL images), so the Tk thread
+    only has to turn the thumbnail into a PhotoImage when the track is shown. Only the
+    tracks of the current prefetch window are kept. Tracks passed as revalidate are
+    checked on the worker thread and reloaded if the track or its .enhanced.lrc sidecar
+    changed on disk, so the caller never touches the file system.
+    """
+
+    def __init__(self, thumbnail_size=(200, 200)):
+        self.thumbnail_size = thumbnail_size
+        self.cache = {}
+        self.pending = set()
+        self.window = set()
+        self.lock = Lock()
+        self.requests = Queue()
+
+        Thread(target=self._worker, daemon=True).start()
+
+    def prefetch(self, file_paths, revalidate=()):
+        # file_paths becomes the new window, anything outside of it is dropped
+        with self.lock:
+            self.window = set(file_paths)
+            for file_path in list(self.cache):
+                if file_path not in self.window:
+                    del self.cache[file_path]
+
+        # Revalidated tracks are queued first, they are usually the one being shown
+        for file_path in [*revalidate, *file_paths]:
+            with self.lock:
+                if file_path in self.pending or (file_path in self.cache and file_path not in revalidate):
+                    continue
+                self.pending.add(file_path)
+            self.requests.put(file_path)
+
+    def get(self, file_path):
+        # Returns None until the track has been loaded, and while it is being revalidated
+        with self.lock:
+            if file_path in self.pending:
+                return None
+            return self.cache.get(file_path)
+
+    def _worker(self):
+        while True:
+            file_path = self.requests.get()
+            with self.lock:
+                in_window = file_path in self.window
+                cached = self.cache.get(file_path)
+            if not in_window:
+                # The player moved on before this track was reached
+                with self.lock:
+                    self.pending.discard(file_path)
+                continue
+
+            # Taken before loading, so a change made while loading is caught by the next revalidation
+            signature = TrackPrefetcher.file_signature(file_path)
+            if cached is not None and cached["signature"] == signature:
+                with self.lock:
+                    self.pending.discard(file_path)
+                continue
+
+            try:
+                track = self.load_track(file_path, self.thumbnail_size)
+            except Exception as e:
+                print(f"Error prefetching {file_path}: {e}")
+                track = {
+                    "song_name": "Unknown",
+                    "artist_name": "Unknown",
+                    "album_art": None,
+                    "duration": 0,
+                    "unsynced_lyrics": None,
+                    "synced_lyrics": [],
+                }
+            track["signature"] = signature
+
+            with self.lock:
+                if file_path in self.window:
+                    self.cache[file_path] = track
+                self.pending.discard(file_path)
+
+    @staticmethod
+    def file_signature(file_path):
+        # Modification times of the track and of the enhanced LRC file the lyrics are read from
+        signature = []
+        for path in (file_path, file_path.rsplit('.', 1)[0] + '.enhanced.lrc'):
+            try:
+                signature.append(os.stat(path).st_mtime_ns)
+            except OSError:
+                signature.append(None)
+        return signature
+
+    @staticmethod
+    def load_track(file_path, thumbnail_size=(200, 200)):
+        song_name, artist_name, album_art_image = MediaInfoHandler.get_track_info(file_path)
+        if album_art_image:
+            album_art_image = album_art_image.resize(thumbnail_size, Image.Resampling.LANCZOS)
+
+        lyrics = LyricsHandler.retrieve_lyrics_from_file(file_path)
+        return {
+            "song_name": song_name,
+            "artist_name": artist_name,
+            "album_art": album_art_image,
+            "duration": MediaInfoHandler.get_duration(file_path),
+            "unsynced_lyrics": lyrics.get("unsynced_lyrics"),
+            "synced_lyrics": LyricsHandler.parse_synced_lyrics(lyrics.get("synced_lyrics")),
+        }
@@ -1,68 +1,270 @@
+import os
 import re
+import json
+import time
 import random
+import shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor
 
 import torch
 import stable_whisper
+from stable_whisper.audio import demucs_audio, load_demucs_model
+from whisper.audio import SAMPLE_RATE
 from mutagen.mp3 import MP3
 from mutagen.flac import FLAC
 from mutagen.id3 import ID3, USLT, SYLT, Encoding
 
 from scripts.lyrics_handler import LyricsHandler
 from scripts.media_handler import MediaInfoHandler
+from scripts.pipeline_checkpoint import PipelineCheckpoint
 
 random.seed(0) # Setting seed so model is deterministic for each run with repeatable results.
 
+# Guards loading into a shared_models dict, so handlers sharing one never load the same model twice
+_shared_models_lock = threading.Lock()
+
 
 class TranscriptionHandler:
-    def __init__(self, model_name='base', download_root='./models'):
+    # Pipeline stages in execution order, each one checkpointed in the track's work directory
+    STAGES = ('lyrics', 'vocals', 'alignment', 'lrc', 'embed')
+
+    def __init__(self, model_name='base', download_root='./models', device=None, work_root='./work',
+                 escalation_models=(), confidence_threshold=0.6, keep_demucs=False, shared_models=None):
+        """
+        Args:
+        model_name (str): Whisper model used for the first pass on every track.
+        download_root (str): Directory the models are downloaded to and loaded from.
+        device (str): Torch device, defaults to CUDA when available.
+        work_root (str): Directory holding per-track pipeline checkpoints.
+        escalation_models (tuple): Larger models, in order, to retry tracks scoring below confidence_threshold.
+            They are loaded the first time a track needs them. Empty disables escalation.
+        confidence_threshold (float): Minimum quality score, between 0 and 1, a result needs to be kept.
+        keep_demucs (bool): Load Demucs now and keep it for every track, for long-lived handlers such as
+            the service pool. Otherwise it is only loaded while transcribe_tracks runs.
+        shared_models (dict): Escalation models loaded so far. Pass the same dict to several handlers, as the
+            service pool does, to load each larger model only once for all of them.
+        """
         # Check if CUDA is available, otherwise use CPU
-        device = 'cuda' if torch.cuda.is_available() else 'cpu'
+        if device is None:
+            device = 'cuda' if torch.cuda.is_available() else 'cpu'
         print(f"Initializing with device: {device}")
-
+        self.device = device
+        self.download_root = download_root
+        self.work_root = work_root
+        self.escalation_models = tuple(escalation_models)
+        self.confidence_threshold = confidence_threshold
+
+        # The first-pass model belongs to this handler, escalation models may be shared with other handlers
+        self.model_name = model_name
+        self.model = self._load_model(model_name)
+        self.shared_models = {} if shared_models is None else shared_models
+
+        # Unless kept, Demucs is only loaded while transcribe_tracks runs, single tracks let stable_whisper load it on demand
+        self.keep_demucs = keep_demucs
+        self.demucs_model = None
+        if keep_demucs:
+            print("Loading Demucs...")
+            self.demucs_model = load_demucs_model()
+
+    def _load_model(self, model_name):
         # Indicate the start of model loading
-        print(f"Loading model '{model_name}' from {download_root}. This may take a few moments...")
+        print(f"Loading model '{model_name}' from {self.download_root}. This may take a few moments...")
 
         # Load the model with the selected device
-        self.model = stable_whisper.load_model(name=model_name, download_root=download_root, device=device)
+        model = stable_whisper.load_model(name=model_name, download_root=self.download_root, device=self.device)
 
         # Confirm model loading and mounting on the device
-        print(f"Model '{model_name}' successfully loaded and mounted on {device}.")
-
-        # NOTE: When implementing multi track/multi album transcripting, only load the model once.
+        print(f"Model '{model_name}' successfully loaded and mounted on {self.device}.")
+        return model
+
+    def _get_escalation_model(self, model_name):
+        # Loaded the first time any handler sharing shared_models needs it
+        with _shared_models_lock:
+            if model_name not in self.shared_models:
+                self.shared_models[model_name] = {"model": self._load_model(model_name), "lock": threading.Lock()}
+            return self.shared_models[model_name]
     
-    def __call__(self, file_path):
+    def __call__(self, file_path, lyrics=None):
         print("Starting conversion and transcription process...")
+        self._run_stages(file_path, lyrics or {})
+
+    def transcribe_tracks(self, file_paths, lyrics=None):
+        """
+        Process several tracks one after another, sharing what can be shared.
+
+        Lyrics for every track are fetched concurrently up front and the Demucs
+        model is loaded once for all tracks instead of being reloaded for each
+        one (the Silero VAD model is already cached by stable_whisper). This is
+        not batched inference: every track still gets its own align/transcribe
+        call through the checkpointed stages, so Whisper's per-call setup and
+        30 s window padding are paid per track.
+
+        Args:
+        file_paths (list): Paths to the MP3/FLAC files to process.
+        lyrics (dict): Optional file path -> processed lyrics mapping, as returned by fetch_lyrics.
+            Tracks missing from it have their lyrics fetched first.
+        """
+        print(f"Starting transcription of {len(file_paths)} tracks...")
+        lyrics = dict(lyrics or {})
+        checkpoints = {file_path: PipelineCheckpoint(file_path, self.work_root) for file_path in file_paths}
+
+        # Tracks resumed from an interrupted run already have their lyrics checkpointed
+        missing = [file_path for file_path in file_paths if file_path not in lyrics and not checkpoints[file_path].is_done('lyrics')]
+        lyrics.update(self.fetch_lyrics(missing))
+
+        # Checkpoint every track's lyrics right away, so a crash on a later track doesn't lose them
+        for file_path, checkpoint in checkpoints.items():
+            if file_path in lyrics:
+                self._seed_lyrics(checkpoint, lyrics[file_path])
+
+        if not self.keep_demucs:
+            print("Loading Demucs once for all tracks...")
+            self.demucs_model = load_demucs_model()
+        try:
+            for file_path in file_paths:
+                self._run_stages(file_path, lyrics)
+        finally:
+            if not self.keep_demucs:
+                self.demucs_model = None
+
+    def fetch_lyrics(self, file_paths, max_workers=4):
+        # Lookups are network bound, so they overlap well on threads
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {file_path: executor.submit(self._fetch_lyrics, file_path) for file_path in file_paths}
+
+        # Tracks whose lookup failed are left out, so their lyrics stage retries it instead of saving them as lyric-less
+        lyrics = {}
+        for file_path, future in futures.items():
+            try:
+                lyrics[file_path] = future.result()
+            except Exception as e:
+                print(f"Error fetching lyrics for {file_path}: {e}")
+        return lyrics
+
+    def _run_stages(self, file_path, known_lyrics):
+        checkpoint = PipelineCheckpoint(file_path, self.work_root)
+        base_file_name = file_path.rsplit('.', 1)[0]
+
+        # A hard kill can leave hidden temporary copies next to the track, the stage that made them reruns anyway
+        checkpoint.sweep_temp_files([
+            file_path,
+            f'{base_file_name}.json',
+            f'{base_file_name}.lrc',
+            f'{base_file_name}.enhanced.lrc',
+            f'{base_file_name}.quality.json',
+        ])
+
+        if file_path in known_lyrics:
+            self._seed_lyrics(checkpoint, known_lyrics[file_path])
+
+        for stage in self.STAGES:
+            if checkpoint.is_done(stage):
+                print(f"Stage '{stage}' was already completed, skipping it.")
+                continue
+
+            start = time.perf_counter()
+            getattr(self, f'_run_{stage}_stage')(file_path, base_file_name, checkpoint)
+            checkpoint.complete(stage, time.perf_counter() - start, source_modified=(stage == 'embed'))
+
+        checkpoint.finish()
+
+    def _seed_lyrics(self, checkpoint, processed_lyrics):
+        # Lyrics fetched ahead of time count as a completed lyrics stage
+        if not checkpoint.is_done('lyrics'):
+            checkpoint.write_json('lyrics.json', {"processed_lyrics": processed_lyrics})
+            checkpoint.complete('lyrics', 0.0)
+
+    # Pipeline Stages
+    def _run_lyrics_stage(self, file_path, base_file_name, checkpoint):
+        checkpoint.write_json('lyrics.json', {"processed_lyrics": self._fetch_lyrics(file_path)})
+
+    def _run_vocals_stage(self, file_path, base_file_name, checkpoint):
+        if not self._checkpointed_lyrics(checkpoint):
+            print("Lyrics not found. Skipping vocal separation.")
+            return
+
+        print("Lyrics found. Separating vocals with Demucs...")
+        vocals_path = checkpoint.path('vocals.wav')
+        temp_path = PipelineCheckpoint.atomic_path(vocals_path)
+        demucs_audio(file_path, output_sr=SAMPLE_RATE, model=self.demucs_model, device=self.device, save_path=temp_path, shifts=2)
+        os.replace(temp_path, vocals_path)
+
+    def _run_alignment_stage(self, file_path, base_file_name, checkpoint):
+        lyrics = self._checkpointed_lyrics(checkpoint)
+        if lyrics:
+            print("Starting alignment with the separated vocals...")
+            result, quality = self._infer_with_escalation(checkpoint.path('vocals.wav'), lyrics, demucs=False)
+        else:
+            print("Starting transcription without alignment...")
+            result, quality = self._infer_with_escalation(file_path, lyrics)
+        print("Alignment completed. Saving checkpoint...")
+        checkpoint.write_json('quality.json', quality)
+        self._save_result_json(result, checkpoint.path('alignment.json'))
+
+    def _run_lrc_stage(self, file_path, base_file_name, checkpoint):
+        result = stable_whisper.WhisperResult(checkpoint.path('alignment.json'))
+        self._save_result(result, base_file_name)
+
+        # Which model won and how confident it was outlives the work directory
+        quality = checkpoint.read_json('quality.json')
+        PipelineCheckpoint.atomic_write(f'{base_file_name}.quality.json', json.dumps(quality, indent=2))
+
+    def _run_embed_stage(self, file_path, base_file_name, checkpoint):
+        self._embed_track(
+            file_path,
+            base_file_name,
+            self._checkpointed_lyrics(checkpoint),
+            before_replace=checkpoint.expect_source_change,
+        )
+
+    def _checkpointed_lyrics(self, checkpoint):
+        return checkpoint.read_json('lyrics.json')["processed_lyrics"]
+
+    def _fetch_lyrics(self, file_path):
         track_name, artist_name, _ = MediaInfoHandler.get_track_info(file_path)
 
         print(f"Fetching lyrics for {track_name} by {artist_name}...")
         lyrics = LyricsHandler.search_lyrics_online(track_name, artist_name)
-        processed_lyrics = lyrics["processed_lyrics"]
-
-        # Extract base file name without extension
-        base_file_name = file_path.rsplit('.', 1)[0]  # Extract base file name
+        if lyrics.get("error") not in (None, LyricsHandler.LYRICS_NOT_FOUND):
+            # Raising keeps the lyrics stage incomplete, a transient failure must not be checkpointed as "no lyrics"
+            raise RuntimeError(f"Could not look up lyrics for {file_path}: {lyrics['error']}")
+        return lyrics.get("processed_lyrics")
 
-        if processed_lyrics:
-            self._align_and_transcribe(file_path, processed_lyrics, base_file_name)
-        else:
-            self._transcribe(file_path, base_file_name)
+    def _embed_track(self, file_path, base_file_name, processed_lyrics, before_replace=None):
         print("Moving on to embedding the lyrics")
         enhanced_lrc_path = f'{base_file_name}.enhanced.lrc'
-        if file_path.lower().endswith('.mp3'):
-            self._embed_lyrics(file_path, enhanced_lrc_path, processed_lyrics)
-        if file_path.lower().endswith('.flac'):
-            self._embed_lyrics(file_path, enhanced_lrc_path, processed_lyrics)
-
-        else:
-            print("Embedding lyrics is only supported for MP3 files.")
-
-    def _align_and_transcribe(self, file_path, lyrics, base_file_name):
-        print("Lyrics found. Starting alignment with audio...")
-        result = self.model.align(
-            audio=file_path,
+        if not file_path.lower().endswith(('.mp3', '.flac')):
+            print("Embedding lyrics is only supported for MP3 and FLAC files.")
+            return
+
+        # Tag a copy and swap it in, so a crash never leaves a half-written audio file
+        temp_path = PipelineCheckpoint.atomic_path(file_path)
+        try:
+            shutil.copy2(file_path, temp_path)
+            self._embed_lyrics(temp_path, enhanced_lrc_path, processed_lyrics)
+            if before_replace:
+                before_replace(temp_path)
+            os.replace(temp_path, file_path)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    # Inference
+    def _infer(self, audio, lyrics, demucs=True, model=None):
+        model = model or self.model
+        if not lyrics:
+            return model.transcribe(
+                audio=audio,
+                word_timestamps=True,
+            )
+
+        return model.align(
+            audio=audio,
             text=lyrics,
             language='en',
             vad=True,
-            demucs=True,
+            demucs=demucs,
             demucs_options=dict(shifts=2),
             original_split=True,
             regroup=True,
@@ -70,38 +272,71 @@ class TranscriptionHandler:
             suppress_word_ts=False,
         )
 
-        print("Alignment completed. Saving result...")
-        
-        result.save_as_json('audio.json')
-    
-        # Saving the LRC and enhanced LRC content
+    def _infer_with_escalation(self, audio, lyrics, demucs=True):
+        result = self._infer(audio, lyrics, demucs)
+        quality = self._score_result(result)
+        quality["model"] = self.model_name
+        print(f"Result quality: {quality['score']:.2f} (confidence {quality['confidence']:.2f}, anomalies {quality['anomaly_ratio']:.2f})")
+
+        for model_name in self.escalation_models:
+            if quality["score"] >= self.confidence_threshold:
+                break
+
+            print(f"Quality below {self.confidence_threshold:.2f}, retrying with model '{model_name}'...")
+            escalation_model = self._get_escalation_model(model_name)
+            # Whisper's word timestamp hooks make concurrent inference on one model unsafe, handlers sharing it take turns
+            with escalation_model["lock"]:
+                candidate = self._infer(audio, lyrics, demucs, model=escalation_model["model"])
+            candidate_quality = self._score_result(candidate)
+            candidate_quality["model"] = model_name
+            print(f"Model '{model_name}' quality: {candidate_quality['score']:.2f}")
+            if candidate_quality["score"] > quality["score"]:
+                result, quality = candidate, candidate_quality
+
+        return result, quality
+
+    def _score_result(self, result, max_word_duration=5.0):
         words = self._extract_words(result)
+        if not words:
+            return {"confidence": 0.0, "anomaly_ratio": 1.0, "score": 0.0}
+
+        # Not every result carries word probabilities, rely on the timing checks alone when they're missing
+        probabilities = [word.probability for word in words if word.probability is not None]
+        confidence = sum(probabilities) / len(probabilities) if probabilities else 1.0
+
+        # Words with no duration, implausibly long durations or that overlap the previous word
+        anomalies = 0
+        previous_end = 0.0
+        for word in words:
+            duration = word.end - word.start
+            if duration <= 0 or duration > max_word_duration or word.start < previous_end - 0.01:
+                anomalies += 1
+            previous_end = max(previous_end, word.end)
+        anomaly_ratio = anomalies / len(words)
+
+        return {
+            "confidence": confidence,
+            "anomaly_ratio": anomaly_ratio,
+            "score": confidence * (1 - anomaly_ratio),
+        }
+
+    def _save_result(self, result, base_file_name):
+        # Saved next to the track so concurrent runs don't overwrite each other's result
+        self._save_result_json(result, f'{base_file_name}.json')
 
-        with open(f'{base_file_name}.lrc', 'w') as lrc_file:
-            lrc_file.write(self._create_lrc(words))
-
-        with open(f'{base_file_name}.enhanced.lrc', 'w') as enhanced_lrc_file:
-            enhanced_lrc_file.write(self._create_enhanced_lrc(words))
-    
-    def _transcribe(self, file_path, base_file_name):
-        print("Lyrics not found. Starting transcription without alignment...")
-        result = self.model.transcribe(
-            audio=file_path,
-            word_timestamps=True,
-        )
-        print("Transcription completed. Saving result...")
-                
-        # Manually specify the path if save_as_json doesn't return it
-        result.save_as_json('audio.json')
-        
         # Saving the LRC and enhanced LRC content
         words = self._extract_words(result)
-
-        with open(f'{base_file_name}.lrc', 'w') as lrc_file:
-            lrc_file.write(self._create_lrc(words))
-
-        with open(f'{base_file_name}.enhanced.lrc', 'w') as enhanced_lrc_file:
-            enhanced_lrc_file.write(self._create_enhanced_lrc(words))
+        PipelineCheckpoint.atomic_write(f'{base_file_name}.lrc', self._create_lrc(words))
+        PipelineCheckpoint.atomic_write(f'{base_file_name}.enhanced.lrc', self._create_enhanced_lrc(words))
+
+    def _save_result_json(self, result, json_path):
+        temp_path = PipelineCheckpoint.atomic_path(json_path)
+        try:
+            result.save_as_json(temp_path)
+            os.replace(temp_path, json_path)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
 
     def _extract_words(self, result):
         words = []
@@ -142,8 +377,10 @@ class TranscriptionHandler:
             with open(enhanced_lrc_path, 'r', encoding='utf-8') as lrc_file:
                 enhanced_lrc = lrc_file.read()
 
-            audio.tags.delall('USLT')
-            audio.tags.add(USLT(encoding=Encoding.UTF8, lang='eng', desc='enhanced', text=cleaned_lyrics))
+            # Tracks without published lyrics only get the synchronized transcription
+            if cleaned_lyrics:
+                audio.tags.delall('USLT')
+                audio.tags.add(USLT(encoding=Encoding.UTF8, lang='eng', desc='enhanced', text=cleaned_lyrics))
 
             sylt_lyrics = self._convert_lrc_to_sylt_format(enhanced_lrc)
             audio.tags.delall('SYLT')
@@ -153,6 +390,10 @@ class TranscriptionHandler:
             print(f"Lyrics embedded into {file_path} successfully.")
         
         elif file_path.lower().endswith('.flac'):
+            if not cleaned_lyrics:
+                print(f"No lyrics to embed into {file_path} (FLAC), leaving its tags unchanged.")
+                return
+
             print(f"Embedding unsynchronized lyrics into {file_path} (FLAC)...")
             audio = FLAC(file_path)
 
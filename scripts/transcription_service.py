@@ -0,0 +1,294 @@
+import os
+import json
+import time
+import uuid
+import asyncio
+import argparse
+from functools import partial
+from urllib.parse import urlsplit, parse_qs
+
+from scripts.transcription_handler import TranscriptionHandler
+
+STATUS_REASONS = {
+    200: "OK",
+    202: "Accepted",
+    400: "Bad Request",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    409: "Conflict",
+    503: "Service Unavailable",
+}
+
+
+class TranscriptionService:
+    """
+    Local HTTP front end for TranscriptionHandler.
+
+    A pool of handlers, each with its Whisper and Demucs models, is loaded once
+    at startup and shared by every client, so jobs never pay the model-load time.
+    Escalation models are loaded once for the whole pool, the first time a job
+    needs them, and jobs escalated to the same model at once take turns on it. Submitted jobs wait in a bounded
+    queue; once it is full new submissions are rejected with 503 until a
+    worker frees a slot. Submitting a file that is already queued or running
+    returns the existing job, so the same track is never processed twice at
+    once. Finished jobs are forgotten job_ttl seconds after they complete.
+
+    Endpoints:
+    POST /jobs                  {"file_path": "..."} -> 202 with the job id, 200 if the file already has an active job
+    GET  /jobs/<id>             Current job status, with the result's quality score once done
+    GET  /jobs/<id>/events      Newline-delimited JSON status updates until the job finishes
+    GET  /jobs/<id>/result      Result as ?format=elrc (default) or ?format=json
+    """
+
+    def __init__(self, pool_size=1, queue_size=8, model_name='base', download_root='./models',
+                 escalation_models=(), confidence_threshold=0.6, job_ttl=3600):
+        self.pool_size = pool_size
+        self.queue_size = queue_size
+        self.model_name = model_name
+        self.download_root = download_root
+        self.escalation_models = escalation_models
+        self.confidence_threshold = confidence_threshold
+        self.job_ttl = job_ttl
+
+        self.shared_models = {}  # Escalation models, loaded once for every handler of the pool
+        self.jobs = {}
+        self.active_jobs = {}  # Absolute file path -> id of its queued or running job
+        self.queue = None
+        self.workers = []
+
+    async def start(self, host='127.0.0.1', port=8765):
+        loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize=self.queue_size)
+
+        print(f"Warming up {self.pool_size} model(s)...")
+        create_handler = partial(
+            TranscriptionHandler,
+            model_name=self.model_name,
+            download_root=self.download_root,
+            escalation_models=self.escalation_models,
+            confidence_threshold=self.confidence_threshold,
+            keep_demucs=True,
+            shared_models=self.shared_models,
+        )
+        handlers = await asyncio.gather(*(loop.run_in_executor(None, create_handler) for _ in range(self.pool_size)))
+        self.workers = [asyncio.create_task(self._worker(handler)) for handler in handlers]
+
+        server = await asyncio.start_server(self._handle_connection, host, port)
+        print(f"Transcription service listening on http://{host}:{port}")
+        return server
+
+    async def serve_forever(self, host='127.0.0.1', port=8765):
+        server = await self.start(host, port)
+        async with server:
+            await server.serve_forever()
+
+    # Job Handling
+    def submit(self, file_path):
+        """
+        Queue file_path for processing and return (job, created). When the file already
+        has a queued or running job, that job is returned with created set to False.
+        """
+        self._expire_jobs()
+        track_key = os.path.abspath(file_path)
+        if track_key in self.active_jobs:
+            return self.jobs[self.active_jobs[track_key]], False
+
+        job_id = uuid.uuid4().hex
+        job = {
+            "id": job_id,
+            "file_path": file_path,
+            "status": "queued",
+            "error": None,
+            "quality": None,
+            "finished_at": None,
+            "updated": asyncio.Condition(),
+        }
+        self.queue.put_nowait(job_id)  # Raises asyncio.QueueFull when the service is saturated
+        self.jobs[job_id] = job
+        self.active_jobs[track_key] = job_id
+        return job, True
+
+    def _expire_jobs(self):
+        now = time.monotonic()
+        expired = [
+            job_id for job_id, job in self.jobs.items()
+            if job["finished_at"] is not None and now - job["finished_at"] > self.job_ttl
+        ]
+        for job_id in expired:
+            del self.jobs[job_id]
+
+    async def _worker(self, handler):
+        loop = asyncio.get_running_loop()
+        while True:
+            job = self.jobs[await self.queue.get()]
+            await self._set_status(job, "running")
+            try:
+                await loop.run_in_executor(None, handler, job["file_path"])
+                job["quality"] = self._read_quality(job)
+                status = "done"
+            except Exception as e:
+                print(f"Error processing {job['file_path']}: {e}")
+                job["error"] = str(e)
+                status = "failed"
+
+            # Release the file before announcing the result, so a client reacting to it can resubmit right away
+            job["finished_at"] = time.monotonic()
+            self.active_jobs.pop(os.path.abspath(job["file_path"]), None)
+            self.queue.task_done()
+            await self._set_status(job, status)
+
+    async def _set_status(self, job, status):
+        async with job["updated"]:
+            job["status"] = status
+            job["updated"].notify_all()
+
+    def _job_info(self, job):
+        return {
+            "id": job["id"],
+            "file_path": job["file_path"],
+            "status": job["status"],
+            "error": job["error"],
+            "quality": job["quality"],
+        }
+
+    def _read_quality(self, job):
+        base_file_name = job["file_path"].rsplit('.', 1)[0]
+        try:
+            with open(f'{base_file_name}.quality.json', 'r', encoding='utf-8') as quality_file:
+                return json.load(quality_file)
+        except FileNotFoundError:
+            return None
+
+    def _read_result(self, job, result_format):
+        base_file_name = job["file_path"].rsplit('.', 1)[0]
+        if result_format == 'json':
+            path, content_type = f'{base_file_name}.json', 'application/json'
+        else:
+            path, content_type = f'{base_file_name}.enhanced.lrc', 'text/plain; charset=utf-8'
+
+        with open(path, 'rb') as result_file:
+            return result_file.read(), content_type
+
+    # HTTP Handling
+    async def _handle_connection(self, reader, writer):
+        try:
+            request_line = (await reader.readline()).decode('latin-1').strip()
+            if not request_line:
+                return
+            method, target, _ = request_line.split(' ', 2)
+
+            headers = {}
+            while True:
+                line = (await reader.readline()).decode('latin-1').strip()
+                if not line:
+                    break
+                name, _, value = line.partition(':')
+                headers[name.strip().lower()] = value.strip()
+
+            body = b''
+            if 'content-length' in headers:
+                body = await reader.readexactly(int(headers['content-length']))
+
+            await self._route(method, target, body, writer)
+        except Exception as e:
+            print(f"Error handling request: {e}")
+            if not writer.is_closing():
+                await self._send_json(writer, 400, {"error": str(e)})
+        finally:
+            writer.close()
+
+    async def _route(self, method, target, body, writer):
+        url = urlsplit(target)
+        parts = [part for part in url.path.split('/') if part]
+
+        if parts == ['jobs']:
+            if method != 'POST':
+                return await self._send_json(writer, 405, {"error": "Use POST to submit a job."})
+            return await self._create_job(body, writer)
+
+        self._expire_jobs()
+        if len(parts) < 2 or parts[0] != 'jobs' or method != 'GET':
+            return await self._send_json(writer, 404, {"error": "Not found."})
+
+        job = self.jobs.get(parts[1])
+        if job is None:
+            return await self._send_json(writer, 404, {"error": "Unknown job."})
+
+        if len(parts) == 2:
+            return await self._send_json(writer, 200, self._job_info(job))
+        if parts[2:] == ['events']:
+            return await self._stream_events(job, writer)
+        if parts[2:] == ['result']:
+            if job["status"] != "done":
+                return await self._send_json(writer, 409, self._job_info(job))
+            result_format = parse_qs(url.query).get('format', ['elrc'])[0]
+            try:
+                content, content_type = self._read_result(job, result_format)
+            except FileNotFoundError:
+                return await self._send_json(writer, 404, {"error": f"No {result_format} result for this job."})
+            return await self._send(writer, 200, content, content_type)
+
+        return await self._send_json(writer, 404, {"error": "Not found."})
+
+    async def _create_job(self, body, writer):
+        file_path = json.loads(body or b'{}').get('file_path')
+        if not file_path or not os.path.isfile(file_path):
+            return await self._send_json(writer, 400, {"error": "file_path must point to an existing file."})
+        if not file_path.lower().endswith(('.mp3', '.flac')):
+            return await self._send_json(writer, 400, {"error": "Only MP3 and FLAC files are supported."})
+
+        try:
+            job, created = self.submit(file_path)
+        except asyncio.QueueFull:
+            return await self._send_json(writer, 503, {"error": "Job queue is full, retry later."}, {"Retry-After": "5"})
+        await self._send_json(writer, 202 if created else 200, self._job_info(job))
+
+    async def _stream_events(self, job, writer):
+        writer.write(self._head(200, 'application/x-ndjson'))
+        while True:
+            async with job["updated"]:
+                info = self._job_info(job)
+                writer.write(json.dumps(info).encode() + b'\n')
+                await writer.drain()
+                if info["status"] in ("done", "failed"):
+                    return
+                await job["updated"].wait()
+
+    def _head(self, status, content_type, content_length=None, extra_headers=None):
+        lines = [f"HTTP/1.1 {status} {STATUS_REASONS[status]}", f"Content-Type: {content_type}", "Connection: close"]
+        if content_length is not None:
+            lines.append(f"Content-Length: {content_length}")
+        for name, value in (extra_headers or {}).items():
+            lines.append(f"{name}: {value}")
+        return ('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1')
+
+    async def _send(self, writer, status, content, content_type, extra_headers=None):
+        writer.write(self._head(status, content_type, len(content), extra_headers))
+        writer.write(content)
+        await writer.drain()
+
+    async def _send_json(self, writer, status, payload, extra_headers=None):
+        await self._send(writer, status, json.dumps(payload).encode(), 'application/json', extra_headers)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve the transcription pipeline over local HTTP.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--pool-size", type=int, default=1, help="Number of warm models kept loaded.")
+    parser.add_argument("--queue-size", type=int, default=8, help="Maximum number of jobs waiting for a model.")
+    parser.add_argument("--model", default="base", help="Whisper model name.")
+    parser.add_argument("--job-ttl", type=int, default=3600, help="Seconds finished jobs are kept for status and result queries.")
+    parser.add_argument("--escalate", nargs="*", default=[], help="Larger models to retry low-confidence tracks with, in order.")
+    parser.add_argument("--confidence-threshold", type=float, default=0.6, help="Quality score below which a track is escalated.")
+    args = parser.parse_args()
+
+    service = TranscriptionService(
+        pool_size=args.pool_size,
+        queue_size=args.queue_size,
+        model_name=args.model,
+        escalation_models=args.escalate,
+        confidence_threshold=args.confidence_threshold,
+        job_ttl=args.job_ttl,
+    )
+    asyncio.run(service.serve_forever(args.host, args.port))
@@ -0,0 +1,71 @@
+import os
+import shutil
+
+from scripts.pipeline_checkpoint import PipelineCheckpoint
+
+
+def make_track(tmp_path):
+    file_path = str(tmp_path / 'track.mp3')
+    with open(file_path, 'wb') as track_file:
+        track_file.write(b'audio')
+    return file_path
+
+
+def test_checkpoint_resumes_completed_stages(tmp_path):
+    file_path = make_track(tmp_path)
+    checkpoint = PipelineCheckpoint(file_path, str(tmp_path / 'work'))
+    checkpoint.write_json('lyrics.json', {"processed_lyrics": "hello"})
+    checkpoint.complete('lyrics', 1.0)
+
+    resumed = PipelineCheckpoint(file_path, str(tmp_path / 'work'))
+    assert resumed.is_done('lyrics')
+    assert resumed.read_json('lyrics.json') == {"processed_lyrics": "hello"}
+
+
+def test_changed_source_discards_checkpoints(tmp_path):
+    file_path = make_track(tmp_path)
+    checkpoint = PipelineCheckpoint(file_path, str(tmp_path / 'work'))
+    checkpoint.complete('lyrics', 1.0)
+
+    with open(file_path, 'ab') as track_file:
+        track_file.write(b'changed')
+
+    assert not PipelineCheckpoint(file_path, str(tmp_path / 'work')).is_done('lyrics')
+
+
+def test_crash_after_embed_swap_keeps_checkpoints(tmp_path):
+    file_path = make_track(tmp_path)
+    checkpoint = PipelineCheckpoint(file_path, str(tmp_path / 'work'))
+    checkpoint.complete('alignment', 1.0)
+
+    # Tag a copy and swap it in, then "crash" before the embed stage is recorded
+    temp_path = PipelineCheckpoint.atomic_path(file_path)
+    shutil.copy2(file_path, temp_path)
+    with open(temp_path, 'ab') as temp_file:
+        temp_file.write(b'tags')
+    checkpoint.expect_source_change(temp_path)
+    os.replace(temp_path, file_path)
+
+    resumed = PipelineCheckpoint(file_path, str(tmp_path / 'work'))
+    assert resumed.is_done('alignment')
+    assert not resumed.is_done('embed')
+
+
+def test_leftover_temp_files_are_swept(tmp_path):
+    file_path = make_track(tmp_path)
+    checkpoint = PipelineCheckpoint(file_path, str(tmp_path / 'work'))
+
+    # Temporary copies a killed run left behind, next to the track and in its work directory
+    stale = [
+        PipelineCheckpoint.atomic_path(file_path),
+        PipelineCheckpoint.atomic_path(str(tmp_path / 'track.enhanced.lrc')),
+        PipelineCheckpoint.atomic_path(checkpoint.path('vocals.wav')),
+    ]
+    unrelated = str(tmp_path / '.other.mp3.abcd1234.tmp.mp3')
+    open(unrelated, 'wb').close()
+
+    PipelineCheckpoint(file_path, str(tmp_path / 'work')).sweep_temp_files([file_path, str(tmp_path / 'track.enhanced.lrc')])
+
+    assert not any(os.path.exists(path) for path in stale)
+    assert os.path.exists(unrelated)
+    assert os.path.exists(file_path)
@@ -0,0 +1,74 @@
+import os
+import time
+
+import pytest
+
+from scripts.track_prefetcher import TrackPrefetcher
+
+
+@pytest.fixture
+def prefetcher(monkeypatch):
+    loads = []
+
+    def fake_load_track(file_path, thumbnail_size=(200, 200)):
+        loads.append(file_path)
+        with open(file_path.rsplit('.', 1)[0] + '.enhanced.lrc', encoding='utf-8') as lrc_file:
+            return {"song_name": os.path.basename(file_path), "unsynced_lyrics": lrc_file.read()}
+
+    monkeypatch.setattr(TrackPrefetcher, 'load_track', staticmethod(fake_load_track))
+    prefetcher = TrackPrefetcher()
+    prefetcher.loads = loads
+    return prefetcher
+
+
+def make_track(tmp_path, name, lyrics):
+    file_path = str(tmp_path / f'{name}.mp3')
+    with open(file_path, 'wb') as track_file:
+        track_file.write(b'audio')
+    with open(str(tmp_path / f'{name}.enhanced.lrc'), 'w', encoding='utf-8') as lrc_file:
+        lrc_file.write(lyrics)
+    return file_path
+
+
+def wait_for(prefetcher, file_path, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        track = prefetcher.get(file_path)
+        if track is not None:
+            return track
+        time.sleep(0.01)
+    raise AssertionError(f"{file_path} was never prefetched")
+
+
+def test_cache_is_bounded_to_the_window(prefetcher, tmp_path):
+    first = make_track(tmp_path, 'first', 'one')
+    second = make_track(tmp_path, 'second', 'two')
+
+    prefetcher.prefetch([first, second])
+    wait_for(prefetcher, first)
+    wait_for(prefetcher, second)
+
+    prefetcher.prefetch([second])
+    assert set(prefetcher.cache) == {second}
+
+
+def test_changed_sidecar_lyrics_are_reloaded(prefetcher, tmp_path):
+    file_path = make_track(tmp_path, 'track', 'old lyrics')
+    prefetcher.prefetch([file_path])
+    assert wait_for(prefetcher, file_path)["unsynced_lyrics"] == 'old lyrics'
+
+    # Revalidating an unchanged track keeps the cached copy
+    prefetcher.prefetch([file_path], revalidate=[file_path])
+    wait_for(prefetcher, file_path)
+    assert prefetcher.loads == [file_path]
+
+    lrc_path = str(tmp_path / 'track.enhanced.lrc')
+    with open(lrc_path, 'w', encoding='utf-8') as lrc_file:
+        lrc_file.write('new lyrics')
+    stat = os.stat(lrc_path)
+    os.utime(lrc_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+    # get() never checks the disk, the change is only picked up by a revalidation
+    assert prefetcher.get(file_path)["unsynced_lyrics"] == 'old lyrics'
+    prefetcher.prefetch([file_path], revalidate=[file_path])
+    assert wait_for(prefetcher, file_path)["unsynced_lyrics"] == 'new lyrics'
@@ -0,0 +1,232 @@
+import os
+import json
+import struct
+import logging
+
+import pytest
+import stable_whisper
+from mutagen.flac import FLAC
+
+import scripts.transcription_handler as transcription_handler
+from scripts.transcription_handler import TranscriptionHandler
+
+
+def make_result(words):
+    return stable_whisper.WhisperResult({
+        "language": "en",
+        "segments": [{
+            "start": 0.0,
+            "end": len(words) * 0.5,
+            "text": " ".join(words),
+            "words": [
+                {"word": f" {word}", "start": index * 0.5, "end": index * 0.5 + 0.4, "probability": 0.9}
+                for index, word in enumerate(words)
+            ],
+        }],
+    })
+
+
+class FakeModel:
+    def __init__(self):
+        self.align_calls = []
+        self.transcribe_calls = []
+
+    def align(self, audio, text, **kwargs):
+        self.align_calls.append((audio, text, kwargs))
+        return make_result(text.split())
+
+    def transcribe(self, audio, **kwargs):
+        self.transcribe_calls.append(audio)
+        return make_result(["untitled"])
+
+
+@pytest.fixture
+def handler(tmp_path, monkeypatch):
+    model = FakeModel()
+    demucs_calls = []
+
+    def fake_demucs_audio(audio, model=None, save_path=None, **kwargs):
+        demucs_calls.append((audio, model))
+        with open(save_path, 'wb') as vocals_file:
+            vocals_file.write(b'vocals')
+
+    monkeypatch.setattr(transcription_handler.stable_whisper, 'load_model', lambda **kwargs: model)
+    monkeypatch.setattr(transcription_handler, 'demucs_audio', fake_demucs_audio)
+    monkeypatch.setattr(transcription_handler, 'load_demucs_model', lambda: 'demucs')
+
+    handler = TranscriptionHandler(device='cpu', work_root=str(tmp_path / 'work'))
+    handler.fake_model = model
+    handler.demucs_calls = demucs_calls
+    return handler
+
+
+def make_tracks(tmp_path, lyrics):
+    # WAV files skip tag embedding, which keeps these tests independent of real MP3 data
+    tracks = {}
+    for name, track_lyrics in lyrics.items():
+        file_path = str(tmp_path / f'{name}.wav')
+        with open(file_path, 'wb') as track_file:
+            track_file.write(name.encode())
+        tracks[file_path] = track_lyrics
+    return tracks
+
+
+def make_flac(file_path):
+    # Smallest file mutagen accepts as FLAC: the marker and a STREAMINFO block (44.1 kHz, stereo, 16 bit)
+    stream_info = struct.pack('>HH', 4096, 4096) + bytes(6) + ((44100 << 44) | (1 << 41) | (15 << 36)).to_bytes(8, 'big') + bytes(16)
+    with open(file_path, 'wb') as flac_file:
+        flac_file.write(b'fLaC' + bytes([0x80, 0, 0, len(stream_info)]) + stream_info)
+
+
+def read_words(file_path):
+    with open(f"{file_path.rsplit('.', 1)[0]}.enhanced.lrc", encoding='utf-8') as lrc_file:
+        return [line.split(' ', 2)[2] for line in lrc_file.read().splitlines()]
+
+
+def test_transcribe_tracks_keeps_tracks_separate(handler, tmp_path):
+    tracks = make_tracks(tmp_path, {
+        "first": "one two three",
+        "second": "four five",
+        "third": None,
+    })
+
+    handler.transcribe_tracks(list(tracks), lyrics=tracks)
+
+    # Every track with lyrics is aligned on its own, with only its own lyrics
+    assert [text for _, text, _ in handler.fake_model.align_calls] == ["one two three", "four five"]
+    assert all(kwargs["demucs"] is False for _, _, kwargs in handler.fake_model.align_calls)
+    assert len(handler.fake_model.transcribe_calls) == 1
+
+    assert read_words(list(tracks)[0]) == ["one", "two", "three"]
+    assert read_words(list(tracks)[1]) == ["four", "five"]
+    assert read_words(list(tracks)[2]) == ["untitled"]
+
+    # The quality score is kept next to the outputs
+    with open(str(tmp_path / 'first.quality.json'), encoding='utf-8') as quality_file:
+        quality = json.load(quality_file)
+    assert quality["model"] == 'base'
+    assert quality["score"] == pytest.approx(0.9)
+
+    # The Demucs model is loaded once, shared by the tracks and released afterwards
+    assert [model for _, model in handler.demucs_calls] == ['demucs', 'demucs']
+    assert handler.demucs_model is None
+    assert os.listdir(handler.work_root) == []
+
+
+def test_single_track_loads_demucs_on_demand(handler, tmp_path, monkeypatch):
+    tracks = make_tracks(tmp_path, {"single": "six seven"})
+    monkeypatch.setattr(TranscriptionHandler, '_fetch_lyrics', lambda self, file_path: tracks[file_path])
+
+    handler(list(tracks)[0])
+
+    assert handler.demucs_calls[0][1] is None
+    assert read_words(list(tracks)[0]) == ["six", "seven"]
+
+
+def test_kept_demucs_is_reused_by_every_call(handler, tmp_path, monkeypatch):
+    monkeypatch.setattr(transcription_handler, 'load_demucs_model', lambda: object())
+    kept = TranscriptionHandler(device='cpu', work_root=str(tmp_path / 'work'), keep_demucs=True)
+    demucs_model = kept.demucs_model
+    tracks = make_tracks(tmp_path, {"first": "one two", "second": "three four"})
+    monkeypatch.setattr(TranscriptionHandler, '_fetch_lyrics', lambda self, file_path: tracks[file_path])
+
+    kept(list(tracks)[0])
+    kept.transcribe_tracks([list(tracks)[1]])
+
+    assert [model for _, model in handler.demucs_calls] == [demucs_model, demucs_model]
+    assert kept.demucs_model is demucs_model
+
+
+def test_interrupted_run_resumes_without_refetching(handler, tmp_path, monkeypatch):
+    tracks = make_tracks(tmp_path, {"first": "one two", "second": "three four"})
+    fetched = []
+
+    def fake_fetch_lyrics(self, file_path):
+        fetched.append(file_path)
+        return tracks[file_path]
+
+    monkeypatch.setattr(TranscriptionHandler, '_fetch_lyrics', fake_fetch_lyrics)
+
+    # Simulate a crash while aligning the second track
+    align = handler.fake_model.align
+
+    def crashing_align(audio, text, **kwargs):
+        if text == "three four":
+            raise MemoryError("out of memory")
+        return align(audio, text, **kwargs)
+
+    handler.fake_model.align = crashing_align
+    with pytest.raises(MemoryError):
+        handler.transcribe_tracks(list(tracks))
+    assert sorted(fetched) == sorted(tracks)
+
+    # The restart reuses the checkpointed lyrics and vocals of the second track
+    fetched.clear()
+    handler.fake_model.align = align
+    demucs_runs = len(handler.demucs_calls)
+    handler.transcribe_tracks([list(tracks)[1]])
+
+    assert fetched == []
+    assert len(handler.demucs_calls) == demucs_runs
+    assert read_words(list(tracks)[1]) == ["three", "four"]
+
+
+def test_flac_without_lyrics_finishes(handler, tmp_path, monkeypatch):
+    file_path = str(tmp_path / 'instrumental.flac')
+    make_flac(file_path)
+    monkeypatch.setattr(TranscriptionHandler, '_fetch_lyrics', lambda self, file_path: None)
+
+    handler(file_path)
+
+    # The transcription is still written, the track just gets no LYRICS tag, and nothing is left to resume
+    assert read_words(file_path) == ["untitled"]
+    assert 'LYRICS' not in FLAC(file_path)
+    assert os.listdir(handler.work_root) == []
+
+
+def test_failed_lyrics_lookup_is_retried(handler, tmp_path, monkeypatch):
+    tracks = make_tracks(tmp_path, {"offline": "eight nine"})
+    file_path = list(tracks)[0]
+    monkeypatch.setattr(transcription_handler.MediaInfoHandler, 'get_track_info', lambda file_path: ("Song", "Artist", None))
+
+    def unreachable_search(search_term):
+        # syncedlyrics logs provider errors and returns None, just like a song without lyrics
+        logging.getLogger('Lrclib').error("Connection refused")
+        return None
+
+    monkeypatch.setattr('scripts.lyrics_handler.syncedlyrics.search', unreachable_search)
+    assert handler.fetch_lyrics([file_path]) == {}
+    with pytest.raises(RuntimeError):
+        handler.transcribe_tracks([file_path])
+    assert handler.fake_model.transcribe_calls == []
+
+    # Once the providers answer, the lookup runs again instead of the track being saved as lyric-less
+    monkeypatch.setattr('scripts.lyrics_handler.syncedlyrics.search', lambda search_term: "[00:01.00] eight nine")
+    handler.transcribe_tracks([file_path])
+
+    assert read_words(file_path) == ["eight", "nine"]
+
+
+def test_escalation_models_are_shared_between_handlers(handler, tmp_path, monkeypatch):
+    loaded = []
+
+    def load_model(name, **kwargs):
+        loaded.append(name)
+        return FakeModel()
+
+    monkeypatch.setattr(transcription_handler.stable_whisper, 'load_model', load_model)
+    shared_models = {}
+    # The fake results score 0.9, a higher threshold makes every track escalate
+    handlers = [
+        TranscriptionHandler(device='cpu', work_root=str(tmp_path / 'work'), escalation_models=('small',),
+                             confidence_threshold=0.95, shared_models=shared_models)
+        for _ in range(2)
+    ]
+    tracks = make_tracks(tmp_path, {"first": "one two", "second": "three four"})
+    monkeypatch.setattr(TranscriptionHandler, '_fetch_lyrics', lambda self, file_path: tracks[file_path])
+
+    for pool_handler, file_path in zip(handlers, tracks):
+        pool_handler(file_path)
+
+    assert loaded == ['base', 'base', 'small']
+    assert len(shared_models['small']["model"].align_calls) == 2
@@ -0,0 +1,162 @@
+import json
+import asyncio
+import threading
+
+import scripts.transcription_service as transcription_service
+from scripts.transcription_service import TranscriptionService
+
+
+class StubHandler:
+    running = 0
+    max_running = 0
+    lock = threading.Lock()
+
+    def __init__(self, **kwargs):
+        pass
+
+    def __call__(self, file_path):
+        with StubHandler.lock:
+            StubHandler.running += 1
+            StubHandler.max_running = max(StubHandler.max_running, StubHandler.running)
+        threading.Event().wait(0.2)
+        with StubHandler.lock:
+            StubHandler.running -= 1
+        with open(f"{file_path.rsplit('.', 1)[0]}.quality.json", 'w') as quality_file:
+            json.dump({"model": "base", "score": 0.9}, quality_file)
+
+
+class BlockingHandler:
+    # Holds every job until the test releases it, so the queue can be filled deterministically
+    release = threading.Event()
+
+    def __init__(self, **kwargs):
+        pass
+
+    def __call__(self, file_path):
+        BlockingHandler.release.wait(5)
+        base_file_name = file_path.rsplit('.', 1)[0]
+        with open(f'{base_file_name}.enhanced.lrc', 'w', encoding='utf-8') as lrc_file:
+            lrc_file.write("[00:00.00] [00:00.40] hello\n")
+        with open(f'{base_file_name}.json', 'w', encoding='utf-8') as json_file:
+            json.dump({"segments": []}, json_file)
+
+
+async def request(port, method, path, body=None):
+    # Minimal HTTP/1.1 client, the service closes every connection once the response is sent
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    payload = json.dumps(body).encode() if isinstance(body, dict) else (body or b'')
+    writer.write(f"{method} {path} HTTP/1.1\r\nHost: localhost\r\nContent-Length: {len(payload)}\r\n\r\n".encode() + payload)
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+
+    head, _, content = response.partition(b'\r\n\r\n')
+    status_line, *header_lines = head.decode('latin-1').split('\r\n')
+    headers = {name.lower(): value.strip() for name, _, value in (line.partition(':') for line in header_lines)}
+    return int(status_line.split(' ')[1]), headers, content
+
+
+def make_track(tmp_path, name):
+    file_path = str(tmp_path / f'{name}.mp3')
+    open(file_path, 'wb').close()
+    return file_path
+
+
+async def wait_until_done(job):
+    async with job["updated"]:
+        await job["updated"].wait_for(lambda: job["status"] in ("done", "failed"))
+
+
+def test_same_file_is_never_processed_twice_at_once(tmp_path, monkeypatch):
+    monkeypatch.setattr(transcription_service, 'TranscriptionHandler', StubHandler)
+    file_path = str(tmp_path / 'track.mp3')
+
+    async def scenario():
+        service = TranscriptionService(pool_size=2)
+        server = await service.start(port=0)
+        try:
+            first, first_created = service.submit(file_path)
+            second, second_created = service.submit(file_path)
+            assert first_created and not second_created
+            assert second is first
+
+            await wait_until_done(first)
+            assert StubHandler.max_running == 1
+            assert service._job_info(first)["quality"] == {"model": "base", "score": 0.9}
+
+            # Once finished, the file can be submitted again
+            third, third_created = service.submit(file_path)
+            assert third_created and third is not first
+            await wait_until_done(third)
+        finally:
+            server.close()
+
+    asyncio.run(scenario())
+
+
+def test_finished_jobs_expire(tmp_path, monkeypatch):
+    monkeypatch.setattr(transcription_service, 'TranscriptionHandler', StubHandler)
+
+    async def scenario():
+        service = TranscriptionService(job_ttl=0)
+        server = await service.start(port=0)
+        try:
+            job, _ = service.submit(str(tmp_path / 'first.mp3'))
+            await wait_until_done(job)
+            await asyncio.sleep(0.01)
+
+            service.submit(str(tmp_path / 'second.mp3'))
+            assert job["id"] not in service.jobs
+        finally:
+            server.close()
+
+    asyncio.run(scenario())
+
+
+def test_http_api(tmp_path, monkeypatch):
+    monkeypatch.setattr(transcription_service, 'TranscriptionHandler', BlockingHandler)
+    BlockingHandler.release.clear()
+
+    async def scenario():
+        service = TranscriptionService(pool_size=1, queue_size=1)
+        server = await service.start(port=0)
+        port = server.sockets[0].getsockname()[1]
+        try:
+            # Bad bodies are rejected before anything is queued
+            assert (await request(port, 'POST', '/jobs', b'not json'))[0] == 400
+            assert (await request(port, 'POST', '/jobs', {"file_path": str(tmp_path / 'missing.mp3')}))[0] == 400
+
+            status, _, content = await request(port, 'POST', '/jobs', {"file_path": make_track(tmp_path, 'first')})
+            assert status == 202
+            first = service.jobs[json.loads(content)["id"]]
+            async with first["updated"]:
+                await first["updated"].wait_for(lambda: first["status"] == "running")
+
+            # One job running and one waiting fill the pool and the queue
+            assert (await request(port, 'POST', '/jobs', {"file_path": make_track(tmp_path, 'second')}))[0] == 202
+            status, headers, _ = await request(port, 'POST', '/jobs', {"file_path": make_track(tmp_path, 'third')})
+            assert status == 503
+            assert headers["retry-after"] == "5"
+
+            events = asyncio.create_task(request(port, 'GET', f'/jobs/{first["id"]}/events'))
+            await asyncio.sleep(0.05)
+            BlockingHandler.release.set()
+            status, headers, content = await events
+            assert status == 200
+            assert headers["content-type"] == 'application/x-ndjson'
+            statuses = [json.loads(line)["status"] for line in content.decode().splitlines()]
+            assert statuses[-1] == "done"
+            assert set(statuses) <= {"running", "done"}
+
+            status, _, content = await request(port, 'GET', f'/jobs/{first["id"]}/result?format=elrc')
+            assert status == 200
+            assert content.decode() == "[00:00.00] [00:00.40] hello\n"
+            status, headers, content = await request(port, 'GET', f'/jobs/{first["id"]}/result?format=json')
+            assert status == 200
+            assert headers["content-type"] == 'application/json'
+            assert json.loads(content) == {"segments": []}
+        finally:
+            BlockingHandler.release.set()
+            server.close()
+
+    asyncio.run(scenario())